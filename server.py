@@ -1,6 +1,9 @@
+import atexit
+import math
 import os
 import sqlite3
-from contextlib import contextmanager
+import threading
+from contextlib import contextmanager, nullcontext
 from fastmcp import FastMCP
 from pathlib import Path
 
@@ -8,25 +11,141 @@ mcp = FastMCP("Banking MCP Server")
 
 DB_PATH = Path(__file__).parent / "db.sqlite"
 
+# Stored in PRAGMA user_version; bump when the schema below changes
+SCHEMA_VERSION = 2
+
+# Largest amount, in dollars, a single tool call may move
+MAX_AMOUNT = 1_000_000_000_000
+
+def _open(read_only: bool = False) -> sqlite3.Connection:
+    """Open a tuned connection in autocommit mode.
+    
+    Write tools manage their own BEGIN IMMEDIATE ... COMMIT blocks. Read
+    connections are opened with mode=ro so SQLite skips write-path setup.
+    """
+    conn = sqlite3.connect(
+        f"{DB_PATH.resolve().as_uri()}?mode=ro" if read_only else DB_PATH,
+        uri=read_only,
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=128,
+    )
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+# One shared write connection; WAL allows a single writer at a time, so
+# get_db() holds this lock whenever it hands out the writer
+_CONN = _open()
+_write_lock = threading.Lock()
+
+# Read connections are opened lazily, one per thread, so concurrent reads
+# run in parallel under WAL instead of queueing on the writer
+_tls = threading.local()
+
+def _reader() -> sqlite3.Connection:
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        conn = _tls.conn = _open(read_only=True)
+    return conn
+
+# Tool SQL lives in constants so every call hits the connection's
+# prepared-statement cache with a byte-identical key
+SQL_INSERT_ACCT = """INSERT INTO accounts (account_name, balance) VALUES (?, ?)
+   RETURNING account_id"""
+SQL_SELECT_ACCT = """SELECT account_id, account_name, balance, created_at
+   FROM accounts WHERE account_id = ?"""
+SQL_SELECT_BAL = "SELECT balance FROM accounts WHERE account_id = ?"
+# The bound keeps balance + ?2 within int64; past it SQLite would silently
+# store the sum as REAL
+SQL_CREDIT_BAL = """UPDATE accounts SET balance = balance + ?2
+   WHERE account_id = ?1 AND balance <= 9223372036854775807 - ?2
+   RETURNING balance"""
+SQL_DEBIT_BAL = """UPDATE accounts SET balance = balance - ?2
+   WHERE account_id = ?1 AND balance >= ?2
+   RETURNING balance"""
+SQL_INSERT_TXN = """INSERT INTO transactions
+   (account_id, transaction_type, amount, balance_after, description)
+   VALUES (?, ?, ?, ?, ?)"""
+# Leads with an all-NULL sentinel row when the account does not exist, so the
+# existence check and the history lookup share one statement
+SQL_SELECT_HIST = """SELECT NULL, NULL, NULL, NULL, NULL, NULL
+   WHERE NOT EXISTS (SELECT 1 FROM accounts WHERE account_id = ?1)
+   UNION ALL
+   SELECT * FROM (
+       SELECT transaction_id, transaction_type, amount,
+              balance_after, timestamp, description
+       FROM transactions
+       WHERE account_id = ?1
+       ORDER BY timestamp DESC
+       LIMIT ?2
+   )"""
+SQL_LIST_ACCTS = """SELECT account_id, account_name, balance, created_at
+   FROM accounts ORDER BY account_id"""
+
+def _to_cents(amount: float) -> int:
+    """Convert a dollar amount to whole cents, the unit money is stored in.
+    
+    Rounds half away from zero, the same rule as SQLite's ROUND() used when
+    migrating REAL balances.
+    """
+    return int(amount * 100 + math.copysign(0.5, amount))
+
 @contextmanager
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+def get_db(read_only: bool = False):
+    conn = _reader() if read_only else _CONN
+    with nullcontext() if read_only else _write_lock:
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
 
 def init_db():
     with get_db() as conn:
         cursor = conn.cursor()
         
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Let the WAL grow larger between checkpoints to batch fsyncs
+        cursor.execute("PRAGMA wal_autocheckpoint=10000")
+        
+        # Skip schema setup when the database is already current
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] >= SCHEMA_VERSION:
+            return
+        
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        # Read the version again under the write lock: another process may
+        # have set up the schema since the unlocked check above
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            cursor.execute("COMMIT")
+            return
+        
+        # Before version 2 money was stored as REAL dollars. Move those
+        # tables aside so their rows can be copied over as integer cents.
+        # Going by the column type, not the version, means already-converted
+        # tables are never scaled by 100 a second time.
+        cursor.execute(
+            "SELECT type FROM pragma_table_info('accounts') WHERE name = 'balance'"
+        )
+        row = cursor.fetchone()
+        legacy = row is not None and row[0] == "REAL"
+        if legacy:
+            cursor.execute("ALTER TABLE accounts RENAME TO accounts_real")
+            cursor.execute("ALTER TABLE transactions RENAME TO transactions_real")
+            cursor.execute("DROP INDEX IF EXISTS idx_txn_account_ts")
+        
         # Accounts table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS accounts (
                 account_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 account_name TEXT NOT NULL,
-                balance REAL NOT NULL DEFAULT 0.0,
+                balance INTEGER NOT NULL DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
@@ -37,18 +156,64 @@ def init_db():
                 transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 account_id INTEGER NOT NULL,
                 transaction_type TEXT NOT NULL,
-                amount REAL NOT NULL,
-                balance_after REAL NOT NULL,
+                amount INTEGER NOT NULL,
+                balance_after INTEGER NOT NULL,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 description TEXT,
                 FOREIGN KEY (account_id) REFERENCES accounts (account_id)
             )
         """)
         
-        conn.commit()
+        if legacy:
+            cursor.execute("""
+                INSERT INTO accounts
+                SELECT account_id, account_name,
+                       CAST(ROUND(balance * 100) AS INTEGER), created_at
+                FROM accounts_real
+            """)
+            cursor.execute("""
+                INSERT INTO transactions
+                SELECT transaction_id, account_id, transaction_type,
+                       CAST(ROUND(amount * 100) AS INTEGER),
+                       CAST(ROUND(balance_after * 100) AS INTEGER),
+                       timestamp, description
+                FROM transactions_real
+            """)
+            cursor.execute("DROP TABLE transactions_real")
+            cursor.execute("DROP TABLE accounts_real")
+        
+        # History lookups filter by account and sort newest-first
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_txn_account_ts
+            ON transactions (account_id, timestamp DESC)
+        """)
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        cursor.execute("COMMIT")
+
+def _checkpoint_on_exit():
+    # Refresh planner stats for the history index and fold the WAL back into
+    # the database on shutdown. ANALYZE invalidates cached statements, so it
+    # never runs mid-request. It is explicit because PRAGMA optimize only
+    # looks at tables queried on the same connection, and history lookups
+    # run on the per-thread readers, not here.
+    # Both steps are optional, so never wait for a busy writer: skip them if
+    # this process or another one holds the write lock.
+    if not _write_lock.acquire(blocking=False):
+        return
+    try:
+        _CONN.execute("PRAGMA busy_timeout=0")
+        _CONN.execute("PRAGMA analysis_limit=400")
+        _CONN.execute("ANALYZE transactions")
+        _CONN.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        _write_lock.release()
 
 # Initialize database
 init_db()
+atexit.register(_checkpoint_on_exit)
 
 
 @mcp.tool()
@@ -62,32 +227,34 @@ def create_account(account_name: str, initial_deposit: float = 0.0) -> str:
     Returns:
         Success message with account details
     """
+    if not math.isfinite(initial_deposit) or initial_deposit > MAX_AMOUNT:
+        return f"Error: Initial deposit must be a number up to ${MAX_AMOUNT:,.2f}"
+    
     if initial_deposit < 0:
         return "Error: Initial deposit cannot be negative"
     
+    cents = _to_cents(initial_deposit)
+    
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO accounts (account_name, balance) VALUES (?, ?)",
-            (account_name, initial_deposit)
-        )
-        account_id = cursor.lastrowid
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(SQL_INSERT_ACCT, (account_name, cents))
+        account_id = cursor.fetchone()[0]
         
-        if initial_deposit > 0:
+        if cents > 0:
             cursor.execute(
-                """INSERT INTO transactions 
-                   (account_id, transaction_type, amount, balance_after, description)
-                   VALUES (?, ?, ?, ?, ?)""",
-                (account_id, "DEPOSIT", initial_deposit, 
-                 initial_deposit, "Initial deposit")
+                SQL_INSERT_TXN,
+                (account_id, "DEPOSIT", cents, cents, "Initial deposit")
             )
         
-        conn.commit()
-        
-        return (f"Account created successfully!\n"
-                f"Account ID: {account_id}\n"
-                f"Account Name: {account_name}\n"
-                f"Initial Balance: ${initial_deposit:.2f}")
+        cursor.execute("COMMIT")
+    
+    # Responses are built after the lock is released so the next writer
+    # is not held up by string formatting
+    return (f"Account created successfully!\n"
+            f"Account ID: {account_id}\n"
+            f"Account Name: {account_name}\n"
+            f"Initial Balance: ${cents / 100:.2f}")
 
 @mcp.tool()
 def deposit(account_id: int, amount: float, description: str = None) -> str:
@@ -101,38 +268,43 @@ def deposit(account_id: int, amount: float, description: str = None) -> str:
     Returns:
         Success message with new balance
     """
-    if amount <= 0:
+    if not math.isfinite(amount) or amount > MAX_AMOUNT:
+        return f"Error: Deposit amount must be a number up to ${MAX_AMOUNT:,.2f}"
+    
+    cents = _to_cents(amount)
+    if cents <= 0:
         return "Error: Deposit amount must be positive"
     
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts WHERE account_id = ?", 
-                      (account_id,))
-        account = cursor.fetchone()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(SQL_CREDIT_BAL, (account_id, cents))
+        row = cursor.fetchone()
         
+        if row:
+            cursor.execute(
+                SQL_INSERT_TXN,
+                (account_id, "DEPOSIT", cents, row[0], description)
+            )
+            cursor.execute("COMMIT")
+        else:
+            # Only look the account up again to explain the failure
+            cursor.execute(SQL_SELECT_BAL, (account_id,))
+            account = cursor.fetchone()
+            cursor.execute("ROLLBACK")
+    
+    if not row:
         if not account:
             return f"Error: Account {account_id} not found"
         
-        new_balance = account["balance"] + amount
-        
-        cursor.execute(
-            "UPDATE accounts SET balance = ? WHERE account_id = ?",
-            (new_balance, account_id)
-        )
-        
-        cursor.execute(
-            """INSERT INTO transactions 
-               (account_id, transaction_type, amount, balance_after, description)
-               VALUES (?, ?, ?, ?, ?)""",
-            (account_id, "DEPOSIT", amount, new_balance, description)
-        )
-        
-        conn.commit()
-        
-        return (f"Deposit successful!\n"
-                f"Account ID: {account_id}\n"
-                f"Amount Deposited: ${amount:.2f}\n"
-                f"New Balance: ${new_balance:.2f}")
+        return (f"Error: Deposit would exceed the maximum balance\n"
+               f"Current Balance: ${account[0] / 100:.2f}\n"
+               f"Requested Deposit: ${cents / 100:.2f}")
+    
+    return (f"Deposit successful!\n"
+            f"Account ID: {account_id}\n"
+            f"Amount Deposited: ${cents / 100:.2f}\n"
+            f"New Balance: ${row[0] / 100:.2f}")
 
 @mcp.tool()
 def withdraw(account_id: int, amount: float, description: str = None) -> str:
@@ -146,43 +318,43 @@ def withdraw(account_id: int, amount: float, description: str = None) -> str:
     Returns:
         Success message with new balance
     """
-    if amount <= 0:
+    if not math.isfinite(amount) or amount > MAX_AMOUNT:
+        return f"Error: Withdrawal amount must be a number up to ${MAX_AMOUNT:,.2f}"
+    
+    cents = _to_cents(amount)
+    if cents <= 0:
         return "Error: Withdrawal amount must be positive"
     
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts WHERE account_id = ?", 
-                      (account_id,))
-        account = cursor.fetchone()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(SQL_DEBIT_BAL, (account_id, cents))
+        row = cursor.fetchone()
         
+        if row:
+            cursor.execute(
+                SQL_INSERT_TXN,
+                (account_id, "WITHDRAWAL", cents, row[0], description)
+            )
+            cursor.execute("COMMIT")
+        else:
+            # Only look the account up again to explain the failure
+            cursor.execute(SQL_SELECT_BAL, (account_id,))
+            account = cursor.fetchone()
+            cursor.execute("ROLLBACK")
+    
+    if not row:
         if not account:
             return f"Error: Account {account_id} not found"
         
-        if account["balance"] < amount:
-            return (f"Error: Insufficient funds\n"
-                   f"Current Balance: ${account['balance']:.2f}\n"
-                   f"Requested Withdrawal: ${amount:.2f}")
-        
-        new_balance = account["balance"] - amount
-        
-        cursor.execute(
-            "UPDATE accounts SET balance = ? WHERE account_id = ?",
-            (new_balance, account_id)
-        )
-        
-        cursor.execute(
-            """INSERT INTO transactions 
-               (account_id, transaction_type, amount, balance_after, description)
-               VALUES (?, ?, ?, ?, ?)""",
-            (account_id, "WITHDRAWAL", amount, new_balance, description)
-        )
-        
-        conn.commit()
-        
-        return (f"Withdrawal successful!\n"
-                f"Account ID: {account_id}\n"
-                f"Amount Withdrawn: ${amount:.2f}\n"
-                f"New Balance: ${new_balance:.2f}")
+        return (f"Error: Insufficient funds\n"
+               f"Current Balance: ${account[0] / 100:.2f}\n"
+               f"Requested Withdrawal: ${cents / 100:.2f}")
+    
+    return (f"Withdrawal successful!\n"
+            f"Account ID: {account_id}\n"
+            f"Amount Withdrawn: ${cents / 100:.2f}\n"
+            f"New Balance: ${row[0] / 100:.2f}")
 
 @mcp.tool()
 def get_balance(account_id: int) -> str:
@@ -194,20 +366,18 @@ def get_balance(account_id: int) -> str:
     Returns:
         Account balance information
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts WHERE account_id = ?", 
-                      (account_id,))
-        account = cursor.fetchone()
+    with get_db(read_only=True) as conn:
+        account = conn.execute(SQL_SELECT_ACCT, (account_id,)).fetchone()
         
         if not account:
             return f"Error: Account {account_id} not found"
         
+        acct_id, name, balance, created_at = account
         return (f"Account Balance:\n"
-                f"Account ID: {account['account_id']}\n"
-                f"Account Name: {account['account_name']}\n"
-                f"Balance: ${account['balance']:.2f}\n"
-                f"Created: {account['created_at']}")
+                f"Account ID: {acct_id}\n"
+                f"Account Name: {name}\n"
+                f"Balance: ${balance / 100:.2f}\n"
+                f"Created: {created_at}")
 
 @mcp.tool()
 def get_transaction_history(account_id: int, limit: int = 10) -> str:
@@ -220,38 +390,28 @@ def get_transaction_history(account_id: int, limit: int = 10) -> str:
     Returns:
         List of recent transactions
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts WHERE account_id = ?", 
-                      (account_id,))
-        if not cursor.fetchone():
-            return f"Error: Account {account_id} not found"
+    with get_db(read_only=True) as conn:
+        transactions = conn.execute(
+            SQL_SELECT_HIST, (account_id, int(limit))
+        ).fetchall()
         
-        cursor.execute(
-            """SELECT * FROM transactions 
-               WHERE account_id = ? 
-               ORDER BY timestamp DESC 
-               LIMIT ?""",
-            (account_id, limit)
-        )
-        
-        transactions = cursor.fetchall()
+        if transactions and transactions[0][0] is None:
+            return f"Error: Account {account_id} not found"
         
         if not transactions:
             return f"No transactions found for account {account_id}"
         
-        result = f"Transaction History for Account {account_id}:\n\n"
-        for tx in transactions:
-            result += f"ID: {tx['transaction_id']} | "
-            result += f"{tx['transaction_type']} | "
-            result += f"${tx['amount']:.2f} | "
-            result += f"Balance After: ${tx['balance_after']:.2f} | "
-            result += f"{tx['timestamp']}"
-            if tx['description']:
-                result += f" | {tx['description']}"
-            result += "\n"
+        parts = [f"Transaction History for Account {account_id}:", ""]
+        for tx_id, tx_type, amount, balance_after, timestamp, description in transactions:
+            line = (f"ID: {tx_id} | {tx_type} | "
+                    f"${amount / 100:.2f} | "
+                    f"Balance After: ${balance_after / 100:.2f} | "
+                    f"{timestamp}")
+            if description:
+                line = f"{line} | {description}"
+            parts.append(line)
         
-        return result
+        return "\n".join(parts) + "\n"
 
 @mcp.tool()
 def list_accounts() -> str:
@@ -260,22 +420,20 @@ def list_accounts() -> str:
     Returns:
         List of all accounts with their details
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts ORDER BY account_id")
-        accounts = cursor.fetchall()
+    with get_db(read_only=True) as conn:
+        accounts = conn.execute(SQL_LIST_ACCTS).fetchall()
         
         if not accounts:
             return "No accounts found in the system"
         
-        result = "All Bank Accounts:\n\n"
-        for acc in accounts:
-            result += f"ID: {acc['account_id']} | "
-            result += f"Name: {acc['account_name']} | "
-            result += f"Balance: ${acc['balance']:.2f} | "
-            result += f"Created: {acc['created_at']}\n"
+        parts = ["All Bank Accounts:", ""]
+        for acct_id, name, balance, created_at in accounts:
+            parts.append(f"ID: {acct_id} | "
+                         f"Name: {name} | "
+                         f"Balance: ${balance / 100:.2f} | "
+                         f"Created: {created_at}")
         
-        return result
+        return "\n".join(parts) + "\n"
 
 if __name__ == "__main__":
 